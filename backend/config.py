@@ -8,7 +8,7 @@ from typing import List
 
 # OpenRouter API Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
 
 # Site info for OpenRouter (optional but recommended)
 SITE_URL = os.getenv("SITE_URL", "https://rag-demo.onrender.com")
@@ -22,6 +22,7 @@ class ModelConfig:
     model_id: str
     max_context_tokens: int
     timeout: int = 8  # seconds
+    hedge_delay: float = 2.0  # seconds to wait before racing the next model
 
 
 # Models in priority order (all free tier)
@@ -50,6 +51,54 @@ MODELS: List[ModelConfig] = [
 TOP_K_CHUNKS = 3
 CHUNK_SIZE = 600  # tokens (target 500-700)
 CHUNK_OVERLAP = 100
+TOKENIZER_ENCODING = "cl100k_base"  # tiktoken encoding used to count tokens
+# If the encoding can't be loaded (its ranks are downloaded on first use
+# unless TIKTOKEN_CACHE_DIR holds them), tokens are estimated from word
+# counts and loading is retried after this many seconds
+TOKENIZER_RETRY_SECONDS = 60
+
+# Re-fit the TF-IDF vocabulary once the corpus has grown by this fraction
+# since the last fit; in between, new chunks are only transformed
+TFIDF_REFIT_GROWTH = 0.5
+
+# Also re-fit when most of the new chunks' words are outside the vocabulary
+# (e.g. a small document on a new topic), and always below this corpus
+# size, where fitting is cheap; otherwise such a document can't be found
+# by its own terms
+TFIDF_REFIT_OOV_FRACTION = 0.5
+TFIDF_ALWAYS_REFIT_CHUNKS = 500
+
+# Above this many chunks the TF-IDF matrix is kept column-major (an inverted
+# index), so a search only touches the postings of the query's terms
+INVERTED_INDEX_MIN_CHUNKS = 2048
+
+# Upload settings
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024  # 5MB for free tier
+
+# PDFs with more pages than this can be extracted by a pool of worker
+# processes (only when at least two spare cores are available). Each worker
+# is a spawned interpreter started per document, costing ~55 MB and most of
+# a second, so the pool is off by default; only raise PDF_MAX_WORKERS on an
+# instance with spare cores and memory after measuring a speedup
+PDF_PROCESS_MIN_PAGES = 200
+PDF_PAGES_PER_TASK = 100  # contiguous pages per worker task
+PDF_MAX_WORKERS = 0  # hard cap on worker processes; 0 disables the pool
+
+# Skip text extraction on PDF pages that reference no fonts and have no
+# annotations or form fields (e.g. scanned images), which can't contain
+# extractable text
+PDF_SKIP_FONTLESS_PAGES = True
+
+# Cache settings
+QUERY_CACHE_SIZE = 256  # cached search results (invalidated on ingest/clear)
+ANSWER_CACHE_SIZE = 256  # cached LLM answers, keyed by question + corpus version
+DOC_CACHE_SIZE = 16  # parsed documents, keyed by content hash (holds full text)
+PAGE_CACHE_SIZE = 500  # extracted PDF pages, keyed by content hash + page number
+PAGE_CACHE_MAX_DOC_PAGES = 100  # larger extractions bypass the page cache, so one document can't evict the rest
+
+# Search micro-batching for concurrent /ask requests: queries that arrive
+# while a batch is running are searched together in the next one
+SEARCH_BATCH_MAX = 32
 
 # RAG Prompt Template
 RAG_PROMPT_TEMPLATE = """You are a retrieval-augmented assistant.
@@ -2,35 +2,40 @@
 Document ingestion pipeline.
 Handles file upload, text extraction, chunking, and embedding.
 """
-from typing import Dict, List
+import time
+from typing import BinaryIO, Dict, List, Union
 from utils.loaders import load_document
-from utils.chunker import chunk_text
+from utils.chunker import chunk_pages, chunk_text, load_encoding
 from retriever import retriever
 
 
-def ingest_document(content: bytes, filename: str) -> Dict:
+def ingest_document(source: Union[bytes, BinaryIO], filename: str) -> Dict:
     """
     Process and ingest a document into the vector store.
     
     Args:
-        content: Raw file bytes
+        source: Raw file bytes or a binary file object positioned at the start
         filename: Original filename
         
     Returns:
         Ingestion result with statistics
     """
-    # Extract text from document
-    text, metadata = load_document(content, filename)
+    # Extract text from document; PDFs come back as page records only
+    text, metadata = load_document(source, filename, return_pages=True)
+    page_texts = metadata.get("page_texts")
     
-    if not text.strip():
+    if not page_texts and (not text or text.isspace()):
         return {
             "success": False,
             "error": "No text content extracted from document",
             "filename": filename
         }
     
-    # Chunk the text
-    chunks = chunk_text(text, filename)
+    # Chunk the text, straight from the page records when the loader has them
+    if page_texts is not None:
+        chunks = chunk_pages(page_texts, filename)
+    else:
+        chunks = chunk_text(text, filename)
     
     if not chunks:
         return {
@@ -42,15 +47,35 @@ def ingest_document(content: bytes, filename: str) -> Dict:
     # Add to vector store
     num_added = retriever.add_chunks(chunks)
     
+    if num_added == 0:
+        # Every chunk is already indexed under this filename
+        return {
+            "success": False,
+            "error": "Document is already indexed",
+            "filename": filename
+        }
+    
     return {
         "success": True,
         "filename": filename,
         "chunks_created": num_added,
         "document_type": metadata.get("type", "unknown"),
-        "total_chunks_in_store": len(retriever.chunks)
+        "total_chunks_in_store": retriever.get_stats()["total_chunks"]
     }
 
 
+def warmup():
+    """
+    Load lazily-initialized resources ahead of the first request:
+    the tokenizer's BPE ranks (downloaded on a fresh instance) and the
+    retriever's vectorizer/scoring code paths.
+    """
+    start = time.perf_counter()
+    load_encoding()
+    retriever.warmup()
+    print(f"Warmup complete in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
 def get_ingestion_stats() -> Dict:
     """Get current ingestion statistics."""
     return retriever.get_stats()
@@ -2,13 +2,15 @@
 LLM Router with multi-model failover for OpenRouter API.
 Tries models sequentially and handles timeouts/errors gracefully.
 """
-import requests
+import asyncio
+import httpx
 import json
-from typing import Tuple, Optional
+from typing import AsyncIterator, Dict, Tuple, Optional
 from config import (
+    ModelConfig,
     MODELS, 
     OPENROUTER_API_KEY, 
-    OPENROUTER_BASE_URL,
+    OPENROUTER_API_BASE,
     SITE_URL,
     SITE_NAME
 )
@@ -23,8 +25,40 @@ class LLMRouter:
     def __init__(self):
         self.models = MODELS
         self.api_key = OPENROUTER_API_KEY
+        # One pooled HTTP/2 client for all calls: TCP+TLS setup is paid once,
+        # and failover attempts share the same multiplexed connection
+        self._client = httpx.AsyncClient(
+            http2=True,
+            base_url=OPENROUTER_API_BASE,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "HTTP-Referer": SITE_URL,
+                "X-Title": SITE_NAME,
+            },
+            limits=httpx.Limits(max_keepalive_connections=20),
+            timeout=None  # per-request timeouts come from ModelConfig
+        )
+    
+    async def aclose(self):
+        """Close the pooled HTTP client."""
+        await self._client.aclose()
+    
+    def _build_payload(self, model_id: str, prompt: str, stream: bool = False) -> dict:
+        """Build the OpenRouter chat completion payload."""
+        payload = {
+            "model": model_id,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,  # Lower temperature for factual responses
+            "max_tokens": 1024,
+        }
+        if stream:
+            payload["stream"] = True
         
-    def _call_model(self, model_id: str, prompt: str, timeout: int) -> Optional[str]:
+        return payload
+    
+    async def _call_model(self, model_id: str, prompt: str, timeout: int) -> Optional[str]:
         """
         Make a single API call to OpenRouter.
         
@@ -32,31 +66,16 @@ class LLMRouter:
             model_id: The OpenRouter model identifier
             prompt: The prompt to send
             timeout: Request timeout in seconds
-            
+        
         Returns:
             Response text or None if failed
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": SITE_URL,
-            "X-Title": SITE_NAME,
-        }
-        
-        payload = {
-            "model": model_id,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3,  # Lower temperature for factual responses
-            "max_tokens": 1024,
-        }
+        payload = self._build_payload(model_id, prompt)
         
         try:
-            response = requests.post(
-                OPENROUTER_BASE_URL,
-                headers=headers,
-                data=json.dumps(payload),
+            response = await self._client.post(
+                "/chat/completions",
+                json=payload,
                 timeout=timeout
             )
             
@@ -68,32 +87,151 @@ class LLMRouter:
             # Log error for debugging
             print(f"Model {model_id} returned status {response.status_code}: {response.text[:200]}")
             return None
-            
-        except requests.exceptions.Timeout:
+        
+        except httpx.TimeoutException:
             print(f"Model {model_id} timed out after {timeout}s")
             return None
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             print(f"Model {model_id} request failed: {str(e)}")
             return None
         except (KeyError, IndexError, json.JSONDecodeError) as e:
             print(f"Model {model_id} response parsing failed: {str(e)}")
             return None
     
-    def generate(self, prompt: str, max_context_tokens: int = None) -> Tuple[str, str]:
+    async def _stream_model(self, model_id: str, prompt: str, timeout: int) -> AsyncIterator[str]:
         """
-        Generate a response using the first available model.
+        Stream a single completion from OpenRouter as server-sent events.
         
         Args:
+            model_id: The OpenRouter model identifier
             prompt: The prompt to send
-            max_context_tokens: Optional limit on context size
+            timeout: Connect/read timeout in seconds (applies per chunk)
+        
+        Yields:
+            Content deltas as they arrive
+        
+        Raises:
+            httpx.HTTPError: On network errors or timeouts
+            RuntimeError: If OpenRouter returns an error
+        """
+        payload = self._build_payload(model_id, prompt, stream=True)
+        
+        async with self._client.stream(
+            "POST",
+            "/chat/completions",
+            json=payload,
+            timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise RuntimeError(f"status {response.status_code}: {body[:200].decode(errors='replace')}")
             
+            async for line in response.aiter_lines():
+                # Skip blank separators and SSE comments (keep-alives)
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(str(chunk["error"]))
+                choices = chunk.get("choices")
+                if choices:
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+    
+    async def generate(self, prompt: str, max_context_tokens: int = None) -> Tuple[str, str]:
+        """
+        Generate a response, racing models with hedged requests.
+        
+        Models are started in priority order. If a model hasn't answered
+        within its hedge_delay, the next one is started in parallel; a
+        failed model starts the next one immediately. The first successful
+        response wins and the remaining requests are cancelled.
+        
+        Args:
+            prompt: The prompt to send
+            max_context_tokens: Optional limit on context size
+        
         Returns:
             Tuple of (response_text, model_name)
-            
+        
         Raises:
             RuntimeError: If all models fail
         """
         errors = []
+        waiting = []
+        
+        for model in self.models:
+            # Skip model if context is too large
+            if max_context_tokens and max_context_tokens > model.max_context_tokens:
+                print(f"Skipping {model.name}: context too large ({max_context_tokens} > {model.max_context_tokens})")
+                continue
+            waiting.append(model)
+        
+        running: Dict[asyncio.Task, ModelConfig] = {}
+        try:
+            while waiting or running:
+                hedge_delay = None
+                if waiting:
+                    model = waiting.pop(0)
+                    print(f"Trying model: {model.name} ({model.model_id})")
+                    task = asyncio.create_task(self._call_model(
+                        model_id=model.model_id,
+                        prompt=prompt,
+                        timeout=model.timeout
+                    ))
+                    running[task] = model
+                    if waiting:
+                        hedge_delay = model.hedge_delay
+                
+                # Returns early on the first completion, or after the hedge
+                # delay so the next model can be started alongside
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                for task in done:
+                    model = running.pop(task)
+                    response = task.result()
+                    if response:
+                        return response, model.name
+                    errors.append(f"{model.name}: failed")
+        finally:
+            for task in running:
+                task.cancel()
+        
+        # All models failed
+        error_msg = "All models failed: " + "; ".join(errors)
+        raise RuntimeError(error_msg)
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_context_tokens: int = None
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Stream a response from the first available model.
+        
+        Fails over to the next model only if the current one errors before
+        its first token; once tokens have been sent there is no retry.
+        
+        Args:
+            prompt: The prompt to send
+            max_context_tokens: Optional limit on context size
+        
+        Yields:
+            Tuples of (token, model_name)
+        
+        Raises:
+            RuntimeError: If all models fail, or a model fails mid-stream
+        """
+        errors = []
         
         for model in self.models:
             # Skip model if context is too large
@@ -101,16 +239,24 @@ class LLMRouter:
                 print(f"Skipping {model.name}: context too large ({max_context_tokens} > {model.max_context_tokens})")
                 continue
             
-            print(f"Trying model: {model.name} ({model.model_id})")
+            print(f"Streaming from model: {model.name} ({model.model_id})")
             
-            response = self._call_model(
-                model_id=model.model_id,
-                prompt=prompt,
-                timeout=model.timeout
-            )
+            started = False
+            try:
+                async for token in self._stream_model(
+                    model_id=model.model_id,
+                    prompt=prompt,
+                    timeout=model.timeout
+                ):
+                    started = True
+                    yield token, model.name
+            except (httpx.HTTPError, RuntimeError, json.JSONDecodeError) as e:
+                if started:
+                    raise RuntimeError(f"{model.name} failed mid-stream: {str(e)}")
+                print(f"Model {model.model_id} stream failed: {str(e)}")
             
-            if response:
-                return response, model.name
+            if started:
+                return
             
             errors.append(f"{model.name}: failed")
         
@@ -4,13 +4,17 @@ Lightweight, stateless design for Render free tier deployment.
 """
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import os
 
-from ingest import ingest_document, get_ingestion_stats, clear_all_documents
-from qa import answer_question
+from ingest import ingest_document, get_ingestion_stats, clear_all_documents, warmup
+from qa import answer_question, answer_question_stream
 from llm_router import llm_router
+from retriever import retriever
+from config import MAX_UPLOAD_BYTES
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -81,6 +85,7 @@ async def root():
         "endpoints": {
             "upload": "POST /upload",
             "ask": "POST /ask",
+            "ask_stream": "POST /ask/stream",
             "stats": "GET /stats",
             "clear": "POST /clear",
             "health": "GET /health"
@@ -100,34 +105,43 @@ async def upload_document(file: UploadFile = File(...)):
     3. Embedded using SentenceTransformers
     4. Stored in FAISS index
     """
-    # Validate file type
+    # The file type is detected from the content during ingestion, so the
+    # name is only used for metadata and citations
     filename = file.filename or "unknown"
-    if not (filename.lower().endswith('.pdf') or filename.lower().endswith('.txt')):
-        raise HTTPException(
-            status_code=400,
-            detail="Only .pdf and .txt files are supported"
-        )
     
-    # Read file content
+    # Starlette has already spooled the upload into a SpooledTemporaryFile
+    # (in memory up to 1MB, then on disk); the loaders view or memory-map
+    # it in place instead of copying the whole body into a bytes object
+    upload = file.file
     try:
-        content = await file.read()
+        size = upload.seek(0, os.SEEK_END)
+        upload.seek(0)
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f"Failed to read file: {str(e)}"
         )
     
-    # Check file size (limit to 5MB for free tier)
-    if len(content) > 5 * 1024 * 1024:
+    # Check file size (limit for free tier)
+    if size > MAX_UPLOAD_BYTES:
         raise HTTPException(
-            status_code=400,
-            detail="File too large. Maximum size is 5MB."
+            status_code=413,
+            detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."
         )
     
-    # Ingest document
+    # Ingest document on a worker thread so parsing and vectorizing
+    # don't block the event loop for concurrent /ask requests
     try:
-        result = ingest_document(content, filename)
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, ingest_document, upload, filename
+        )
         return UploadResponse(**result)
+    except ValueError as e:
+        # Content is neither a PDF nor text
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -135,6 +149,22 @@ async def upload_document(file: UploadFile = File(...)):
         )
 
 
+def _validate_question(question: str):
+    """Reject empty or overly long questions."""
+    if not question.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Question cannot be empty"
+        )
+    
+    # Limit question length
+    if len(question) > 1000:
+        raise HTTPException(
+            status_code=400,
+            detail="Question too long. Maximum 1000 characters."
+        )
+
+
 # Question answering
 @app.post("/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
@@ -147,21 +177,10 @@ async def ask_question(request: QuestionRequest):
     3. Generate answer with LLM
     4. Return answer with citations
     """
-    if not request.question.strip():
-        raise HTTPException(
-            status_code=400,
-            detail="Question cannot be empty"
-        )
-    
-    # Limit question length
-    if len(request.question) > 1000:
-        raise HTTPException(
-            status_code=400,
-            detail="Question too long. Maximum 1000 characters."
-        )
+    _validate_question(request.question)
     
     try:
-        result = answer_question(
+        result = await answer_question(
             question=request.question,
             top_k=min(request.top_k or 3, 5)  # Cap at 5
         )
@@ -173,6 +192,26 @@ async def ask_question(request: QuestionRequest):
         )
 
 
+# Streaming question answering
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a question and stream the answer as server-sent events.
+    
+    Same pipeline as /ask, but citations are sent as soon as retrieval
+    finishes and answer tokens are forwarded as the LLM generates them.
+    """
+    _validate_question(request.question)
+    
+    return StreamingResponse(
+        answer_question_stream(
+            question=request.question,
+            top_k=min(request.top_k or 3, 5)  # Cap at 5
+        ),
+        media_type="text/event-stream"
+    )
+
+
 # Get statistics
 @app.get("/stats", response_model=StatsResponse)
 async def get_stats():
@@ -186,7 +225,8 @@ async def get_stats():
 @app.post("/clear")
 async def clear_documents():
     """Clear all uploaded documents from memory."""
-    result = clear_all_documents()
+    # Waits for any in-flight ingest, so keep it off the event loop
+    result = await asyncio.get_running_loop().run_in_executor(None, clear_all_documents)
     return result
 
 
@@ -199,6 +239,21 @@ async def startup_event():
     print(f"API Key configured: {bool(os.getenv('OPENROUTER_API_KEY'))}")
     print(f"Available models: {llm_router.get_available_models()}")
     print("=" * 50)
+    
+    # Coalesce concurrent /ask searches into batches
+    app.state.search_batcher = asyncio.create_task(retriever.run_search_batcher())
+    
+    # Warm up in the background so startup (and Render's health check)
+    # isn't delayed, but the first real request doesn't pay for it
+    app.state.warmup = asyncio.get_running_loop().run_in_executor(None, warmup)
+
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and release connections on shutdown."""
+    app.state.search_batcher.cancel()
+    await llm_router.aclose()
 
 
 if __name__ == "__main__":
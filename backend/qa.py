@@ -2,19 +2,25 @@
 Question-Answering pipeline using RAG.
 Combines retrieval and LLM generation with citations.
 """
-from typing import Dict, List
-from retriever import retriever
+import hashlib
+import json
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from retriever import ChunkHit, retriever
 from llm_router import llm_router
-from config import RAG_PROMPT_TEMPLATE, TOP_K_CHUNKS
+from config import RAG_PROMPT_TEMPLATE, TOP_K_CHUNKS, ANSWER_CACHE_SIZE
 from utils.chunker import estimate_tokens
 
+# LRU of answer cache key -> successful answer_question response
+_ANSWER_CACHE: OrderedDict = OrderedDict()
 
-def build_context(chunks: List[Dict]) -> str:
+
+def build_context(chunks: List[ChunkHit]) -> str:
     """
     Build context string from retrieved chunks.
     
     Args:
-        chunks: List of retrieved chunk dictionaries
+        chunks: Retrieved chunk hits
         
     Returns:
         Formatted context string with source references
@@ -22,18 +28,18 @@ def build_context(chunks: List[Dict]) -> str:
     context_parts = []
     
     for chunk in chunks:
-        source_ref = f"[source: {chunk['filename']}, chunk {chunk['chunk_index']}]"
-        context_parts.append(f"{source_ref}\n{chunk['text']}")
+        source_ref = f"[source: {chunk.filename}, chunk {chunk.chunk_index}]"
+        context_parts.append(f"{source_ref}\n{chunk.text}")
     
     return "\n\n---\n\n".join(context_parts)
 
 
-def format_citations(chunks: List[Dict]) -> List[Dict]:
+def format_citations(chunks: List[ChunkHit]) -> List[Dict]:
     """
     Format chunks into citation objects.
     
     Args:
-        chunks: List of retrieved chunk dictionaries
+        chunks: Retrieved chunk hits
         
     Returns:
         List of citation dictionaries
@@ -41,47 +47,35 @@ def format_citations(chunks: List[Dict]) -> List[Dict]:
     citations = []
     for chunk in chunks:
         citations.append({
-            "filename": chunk["filename"],
-            "chunk_index": chunk["chunk_index"],
-            "text_preview": chunk["text"][:200] + "..." if len(chunk["text"]) > 200 else chunk["text"],
-            "relevance_score": round(chunk.get("score", 0), 3)
+            "filename": chunk.filename,
+            "chunk_index": chunk.chunk_index,
+            "text_preview": chunk.text[:200] + "..." if len(chunk.text) > 200 else chunk.text,
+            "relevance_score": round(chunk.score, 3)
         })
     return citations
 
 
-def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
+async def _prepare(question: str, top_k: int) -> Tuple[Optional[str], List[ChunkHit], str, int]:
     """
-    Answer a question using RAG pipeline.
+    Retrieve chunks for a question and build the LLM prompt.
     
     Args:
         question: User's question
         top_k: Number of chunks to retrieve
         
     Returns:
-        Response dictionary with answer, citations, and model info
+        Tuple of (error, chunks, prompt, total_tokens); error is None on success
     """
     # Check if we have any documents
     stats = retriever.get_stats()
     if stats["total_chunks"] == 0:
-        return {
-            "success": False,
-            "error": "No documents uploaded. Please upload a document first.",
-            "answer": None,
-            "citations": [],
-            "model_used": None
-        }
+        return "No documents uploaded. Please upload a document first.", [], "", 0
     
-    # Retrieve relevant chunks
-    chunks = retriever.search(question, top_k=top_k)
+    # Retrieve relevant chunks (batched with concurrent requests)
+    chunks = await retriever.search_async(question, top_k=top_k)
     
     if not chunks:
-        return {
-            "success": False,
-            "error": "No relevant content found for your question.",
-            "answer": None,
-            "citations": [],
-            "model_used": None
-        }
+        return "No relevant content found for your question.", [], "", 0
     
     # Build context
     context = build_context(chunks)
@@ -98,9 +92,72 @@ def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
         question=question
     )
     
+    return None, chunks, prompt, total_tokens
+
+
+def _answer_cache_key(question: str, top_k: int) -> str:
+    """
+    Key an answer by normalized question, top_k and corpus version.
+    
+    The corpus version changes on every ingest/clear, so cached answers
+    never outlive the documents they were generated from.
+    """
+    normalized = " ".join(question.lower().split())
+    key = f"{normalized}|{top_k}|{retriever.corpus_version}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _get_cached_answer(key: str) -> Optional[Dict]:
+    """Return a copy of a cached answer response, if any."""
+    cached = _ANSWER_CACHE.get(key)
+    if cached is None:
+        return None
+    _ANSWER_CACHE.move_to_end(key)
+    return dict(cached)
+
+
+def _cache_answer(key: str, result: Dict):
+    """Store a successful answer response, evicting the oldest entry."""
+    _ANSWER_CACHE[key] = dict(result)
+    if len(_ANSWER_CACHE) > ANSWER_CACHE_SIZE:
+        _ANSWER_CACHE.popitem(last=False)
+
+
+def _sse(event: Dict) -> str:
+    """Encode an event as a server-sent events message."""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
+    """
+    Answer a question using RAG pipeline.
+    
+    Args:
+        question: User's question
+        top_k: Number of chunks to retrieve
+        
+    Returns:
+        Response dictionary with answer, citations, and model info
+    """
+    # Identical question over an unchanged corpus: skip retrieval and LLM
+    cache_key = _answer_cache_key(question, top_k)
+    cached = _get_cached_answer(cache_key)
+    if cached is not None:
+        return cached
+    
+    error, chunks, prompt, total_tokens = await _prepare(question, top_k)
+    if error:
+        return {
+            "success": False,
+            "error": error,
+            "answer": None,
+            "citations": [],
+            "model_used": None
+        }
+    
     try:
         # Generate answer with failover
-        answer, model_used = llm_router.generate(
+        answer, model_used = await llm_router.generate(
             prompt=prompt,
             max_context_tokens=total_tokens
         )
@@ -108,7 +165,7 @@ def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
         # Format citations
         citations = format_citations(chunks)
         
-        return {
+        result = {
             "success": True,
             "answer": answer,
             "citations": citations,
@@ -116,6 +173,8 @@ def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
             "chunks_used": len(chunks),
             "context_tokens": total_tokens
         }
+        _cache_answer(cache_key, result)
+        return result
         
     except RuntimeError as e:
         return {
@@ -125,3 +184,79 @@ def answer_question(question: str, top_k: int = TOP_K_CHUNKS) -> Dict:
             "citations": format_citations(chunks),
             "model_used": None
         }
+
+
+async def answer_question_stream(question: str, top_k: int = TOP_K_CHUNKS) -> AsyncIterator[str]:
+    """
+    Answer a question using RAG pipeline, streaming server-sent events.
+    
+    Emits a "citations" event once retrieval is done, a "token" event per
+    generated text delta, and finally a "done" event with the model used.
+    Any failure is reported as an "error" event that ends the stream.
+    
+    Args:
+        question: User's question
+        top_k: Number of chunks to retrieve
+        
+    Yields:
+        SSE-formatted event strings
+    """
+    try:
+        async for event in _answer_stream_events(question, top_k):
+            yield event
+    except Exception as e:
+        # The response has already started, so this can't become a 500
+        yield _sse({"type": "error", "error": f"Question answering failed: {str(e)}"})
+
+
+async def _answer_stream_events(question: str, top_k: int) -> AsyncIterator[str]:
+    """Produce answer_question_stream's events; unexpected errors propagate."""
+    # Cached answers are replayed as a single token event
+    cache_key = _answer_cache_key(question, top_k)
+    cached = _get_cached_answer(cache_key)
+    if cached is not None:
+        yield _sse({
+            "type": "citations",
+            "citations": cached["citations"],
+            "chunks_used": cached["chunks_used"],
+            "context_tokens": cached["context_tokens"]
+        })
+        yield _sse({"type": "token", "content": cached["answer"]})
+        yield _sse({"type": "done", "model_used": cached["model_used"]})
+        return
+    
+    error, chunks, prompt, total_tokens = await _prepare(question, top_k)
+    if error:
+        yield _sse({"type": "error", "error": error})
+        return
+    
+    citations = format_citations(chunks)
+    yield _sse({
+        "type": "citations",
+        "citations": citations,
+        "chunks_used": len(chunks),
+        "context_tokens": total_tokens
+    })
+    
+    tokens = []
+    model_used = None
+    try:
+        async for token, model_used in llm_router.generate_stream(
+            prompt=prompt,
+            max_context_tokens=total_tokens
+        ):
+            tokens.append(token)
+            yield _sse({"type": "token", "content": token})
+    except RuntimeError as e:
+        yield _sse({"type": "error", "error": str(e)})
+        return
+    
+    _cache_answer(cache_key, {
+        "success": True,
+        "answer": "".join(tokens),
+        "citations": citations,
+        "model_used": model_used,
+        "chunks_used": len(chunks),
+        "context_tokens": total_tokens
+    })
+    yield _sse({"type": "done", "model_used": model_used})
@@ -3,12 +3,62 @@ TF-IDF based retriever for semantic search.
 Lightweight implementation using scikit-learn, optimized for Render free tier.
 No Rust compilation required.
 """
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 import numpy as np
+from scipy import sparse
 from typing import List, Dict, Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-from config import TOP_K_CHUNKS
+from config import (
+    TOP_K_CHUNKS,
+    QUERY_CACHE_SIZE,
+    TFIDF_REFIT_GROWTH,
+    TFIDF_REFIT_OOV_FRACTION,
+    TFIDF_ALWAYS_REFIT_CHUNKS,
+    INVERTED_INDEX_MIN_CHUNKS,
+    SEARCH_BATCH_MAX
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ChunkHit:
+    """
+    A single search result. Fields reference the stored chunk data rather
+    than copying it, and hits are immutable so cached ones can be shared.
+    """
+    text: str
+    filename: str
+    chunk_index: int
+    token_estimate: int
+    score: float
+    rank: int
+
+
+def _make_vectorizer() -> TfidfVectorizer:
+    """Create an unfitted TF-IDF vectorizer with the retriever settings."""
+    return TfidfVectorizer(
+        max_features=5000,
+        stop_words='english',
+        ngram_range=(1, 2),
+        dtype=np.float32  # half the memory/bandwidth of the float64 default
+    )
+
+
+def _maybe_promote_index(tfidf_matrix: sparse.spmatrix) -> sparse.spmatrix:
+    """
+    Pick the storage layout for the TF-IDF matrix.
+    
+    Small corpora stay CSR and are scored with one full product. Large
+    corpora switch to CSC, where each column is a term's posting list,
+    so scoring can skip every term that isn't in the query.
+    """
+    if tfidf_matrix.shape[0] > INVERTED_INDEX_MIN_CHUNKS:
+        return tfidf_matrix.tocsc()
+    return tfidf_matrix.tocsr()
 
 
 class TFIDFRetriever:
@@ -21,13 +71,26 @@ class TFIDFRetriever:
     def __init__(self):
         """Initialize the retriever."""
         print("Initializing TF-IDF Retriever (lightweight mode)")
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        self.vectorizer = _make_vectorizer()
         self.tfidf_matrix = None
-        self.chunks: List[Dict] = []
+        # Chunk fields stored column-wise (row i of tfidf_matrix is chunk i);
+        # result dicts are only built for the top-k hits of a search
+        self.texts: List[str] = []
+        self.filenames: List[str] = []
+        self.chunk_indices = np.empty(0, dtype=np.int32)
+        self.token_estimates = np.empty(0, dtype=np.int32)
+        self._fitted_rows = 0  # corpus size at the last vectorizer fit
+        self.corpus_version = 0  # bumped whenever the indexed corpus changes
+        self._chunk_keys: set = set()  # SHA-256 digests of indexed (filename, text) pairs
+        self._analyzer = self.vectorizer.build_analyzer()
+        # LRU of analyzed query terms -> (top_k, results)
+        self._query_cache: OrderedDict = OrderedDict()
+        self._search_queue: Optional[asyncio.Queue] = None  # set while the batcher runs
+        # Ingest and search run on worker threads. _write_lock serializes
+        # writers; _lock guards the published index state and caches and is
+        # only held briefly, so searches don't wait on a slow re-fit.
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
         print("Retriever initialized")
     
     def add_chunks(self, chunks: List[Dict]) -> int:
@@ -43,16 +106,90 @@ class TFIDFRetriever:
         if not chunks:
             return 0
         
-        # Add new chunks
-        self.chunks.extend(chunks)
+        with self._write_lock:
+            # Skip chunks already indexed for the same file, so re-uploading a
+            # document doesn't trigger a re-fit or duplicate hits. The filename
+            # is part of the key: the same text in another file (a renamed
+            # copy, shared boilerplate) is indexed and cited under that file too
+            new_chunks = []
+            new_keys = set()
+            for chunk in chunks:
+                key = hashlib.sha256(
+                    f"{chunk['filename']}\0{chunk['text']}".encode("utf-8")
+                ).digest()
+                if key in self._chunk_keys or key in new_keys:
+                    continue
+                new_keys.add(key)
+                new_chunks.append(chunk)
+            
+            if not new_chunks:
+                return 0
+            
+            # Build the new index off to the side; searches keep using the
+            # current one until it is published below
+            new_texts = [chunk["text"] for chunk in new_chunks]
+            texts = self.texts + new_texts
+            filenames = self.filenames + [chunk["filename"] for chunk in new_chunks]
+            chunk_indices = np.concatenate([
+                self.chunk_indices,
+                np.fromiter((chunk["chunk_index"] for chunk in new_chunks), dtype=np.int32)
+            ])
+            token_estimates = np.concatenate([
+                self.token_estimates,
+                np.fromiter((chunk.get("token_estimate", 0) for chunk in new_chunks), dtype=np.int32)
+            ])
+            vectorizer = self.vectorizer
+            fitted_rows = self._fitted_rows
+            
+            if (self.tfidf_matrix is None or
+                    len(texts) <= TFIDF_ALWAYS_REFIT_CHUNKS or
+                    len(texts) >= fitted_rows * (1 + TFIDF_REFIT_GROWTH) or
+                    self._oov_fraction(vectorizer, new_texts) > TFIDF_REFIT_OOV_FRACTION):
+                # Re-fit vectorizer on all texts; on large corpora refitting
+                # mostly after geometric growth keeps the total fitting work
+                # near linear in corpus size
+                vectorizer = _make_vectorizer()
+                tfidf_matrix = vectorizer.fit_transform(texts)
+                fitted_rows = len(texts)
+            else:
+                # Vectorize only the new chunks against the current vocabulary
+                new_matrix = vectorizer.transform(new_texts)
+                tfidf_matrix = sparse.vstack([self.tfidf_matrix, new_matrix])
+            tfidf_matrix = _maybe_promote_index(tfidf_matrix)
+            
+            with self._lock:
+                self.vectorizer = vectorizer
+                self.tfidf_matrix = tfidf_matrix
+                self.texts = texts
+                self.filenames = filenames
+                self.chunk_indices = chunk_indices
+                self.token_estimates = token_estimates
+                self._fitted_rows = fitted_rows
+                self._chunk_keys |= new_keys
+                self._query_cache.clear()
+                self.corpus_version += 1
         
-        # Re-fit vectorizer on all texts
-        texts = [chunk["text"] for chunk in self.chunks]
-        self.tfidf_matrix = self.vectorizer.fit_transform(texts)
+        return len(new_chunks)
+    
+    def _oov_fraction(self, vectorizer: TfidfVectorizer, texts: List[str]) -> float:
+        """
+        Fraction of the words in texts that the vectorizer's vocabulary lacks.
         
-        return len(chunks)
+        Only unigrams are counted: a capped vocabulary misses most bigrams
+        of any new text, so they would say little about its topic.
+        """
+        vocabulary = vectorizer.vocabulary_
+        total = missing = 0
+        for text in texts:
+            for term in self._analyzer(text):
+                if ' ' in term:
+                    continue
+                total += 1
+                if term not in vocabulary:
+                    missing += 1
+        return missing / total if total else 0.0
     
-    def search(self, query: str, top_k: int = TOP_K_CHUNKS) -> List[Dict]:
+    def search(self, query: str, top_k: int = TOP_K_CHUNKS) -> List[ChunkHit]:
         """
         Search for most similar chunks to query.
         
@@ -61,51 +198,215 @@ class TFIDFRetriever:
             top_k: Number of results to return
             
         Returns:
-            List of chunk dictionaries with similarity scores
+            List of hits ordered by similarity score
         """
-        if self.tfidf_matrix is None or len(self.chunks) == 0:
-            return []
+        return self.search_batch([query], [top_k])[0]
+    
+    def _cache_get(self, cache_key: tuple, top_k: int) -> Optional[List[ChunkHit]]:
+        """Return cached hits for analyzed query terms, or None; call with _lock held."""
+        cached = self._query_cache.get(cache_key)
+        if cached is None or cached[0] < top_k:
+            return None
+        self._query_cache.move_to_end(cache_key)
+        return list(cached[1][:top_k])
+    
+    def search_batch(self, queries: List[str], top_ks: List[int]) -> List[List[ChunkHit]]:
+        """
+        Search for several queries at once.
         
-        # Limit top_k to available chunks
-        top_k = min(top_k, len(self.chunks))
+        Cache misses are vectorized together and scored in a single
+        similarity pass, which is cheaper than one pass per query.
         
-        # Transform query
-        query_vector = self.vectorizer.transform([query])
+        Args:
+            queries: Search queries
+            top_ks: Number of results to return for each query
+            
+        Returns:
+            One list of hits per query, in input order
+        """
+        results: List[List[ChunkHit]] = [[] for _ in queries]
         
-        # Calculate cosine similarity
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix).flatten()
+        misses = []  # (position, cache_key, top_k)
+        with self._lock:
+            # Work on a consistent snapshot; add_chunks publishes new objects
+            # rather than mutating these
+            vectorizer = self.vectorizer
+            tfidf_matrix = self.tfidf_matrix
+            texts = self.texts
+            filenames = self.filenames
+            chunk_indices = self.chunk_indices
+            token_estimates = self.token_estimates
+            if tfidf_matrix is None or len(texts) == 0:
+                return results
+            
+            for pos, (query, top_k) in enumerate(zip(queries, top_ks)):
+                # Limit top_k to available chunks
+                top_k = min(top_k, len(texts))
+                
+                # Queries that analyze to the same terms map to the same TF-IDF
+                # vector ("What is X?" vs "what is x"), so they share a cache entry
+                cache_key = tuple(sorted(self._analyzer(query)))
+                hits = self._cache_get(cache_key, top_k)
+                if hits is not None:
+                    results[pos] = hits
+                else:
+                    misses.append((pos, cache_key, top_k))
         
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        if not misses:
+            return results
         
-        # Build results
-        results = []
-        for i, idx in enumerate(top_indices):
-            chunk = self.chunks[idx].copy()
-            chunk["score"] = float(similarities[idx])
-            chunk["rank"] = i + 1
-            results.append(chunk)
+        # Transform all missed queries together
+        query_vectors = vectorizer.transform([queries[pos] for pos, _, _ in misses])
+        
+        # TfidfVectorizer L2-normalizes every row, so the inner product is
+        # already the cosine similarity. CSR corpus times a dense query block
+        # writes float32 scores straight into one (chunks, queries) array:
+        # no sparse intermediate, no toarray() copy, no float64 upcast
+        query_block = query_vectors.T.toarray()
+        if tfidf_matrix.format == "csc":
+            # Inverted index: only the columns (terms) present in some query
+            # contribute, so score against just those posting lists
+            terms = np.unique(query_vectors.indices)
+            similarities = tfidf_matrix[:, terms] @ query_block[terms]
+        else:
+            similarities = tfidf_matrix @ query_block
+        
+        for col, (pos, _, top_k) in enumerate(misses):
+            row = similarities[:, col]
+            # Get top-k indices: O(N) selection, then sort only those k
+            if top_k >= len(row):
+                top_indices = np.argsort(-row)
+            else:
+                part = np.argpartition(-row, top_k)[:top_k]
+                top_indices = part[np.argsort(-row[part])]
+            
+            # Build results (at most top_k, so no per-hit append)
+            results[pos] = [
+                ChunkHit(
+                    text=texts[idx],
+                    filename=filenames[idx],
+                    chunk_index=int(chunk_indices[idx]),
+                    token_estimate=int(token_estimates[idx]),
+                    score=float(row[idx]),
+                    rank=rank
+                )
+                for rank, idx in enumerate(top_indices, start=1)
+            ]
+        
+        with self._lock:
+            # Only cache results computed against the current index
+            if self.tfidf_matrix is tfidf_matrix:
+                for pos, cache_key, top_k in misses:
+                    self._query_cache[cache_key] = (top_k, tuple(results[pos]))
+                    if len(self._query_cache) > QUERY_CACHE_SIZE:
+                        self._query_cache.popitem(last=False)
         
         return results
     
+    async def search_async(self, query: str, top_k: int = TOP_K_CHUNKS) -> List[ChunkHit]:
+        """
+        Search from async code, coalescing with other concurrent requests.
+        
+        Cached results are returned right away. Other queries go to the
+        background batcher, which searches them together with any that
+        queued up meanwhile. Falls back to a direct search if the batcher
+        isn't running.
+        
+        Args:
+            query: Search query
+            top_k: Number of results to return
+            
+        Returns:
+            List of hits ordered by similarity score
+        """
+        with self._lock:
+            if self.tfidf_matrix is None or len(self.texts) == 0:
+                return []
+            hits = self._cache_get(tuple(sorted(self._analyzer(query))), min(top_k, len(self.texts)))
+        if hits is not None:
+            return hits
+        
+        if self._search_queue is None:
+            return self.search(query, top_k)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._search_queue.put((query, top_k, future))
+        return await future
+    
+    async def run_search_batcher(self):
+        """
+        Serve search_async requests in micro-batches until cancelled.
+        
+        Waits for a first request, takes every other request already
+        queued (at most SEARCH_BATCH_MAX in total), then runs one
+        search_batch call on the default thread pool. Nothing waits for a
+        batch to fill: a lone request is dispatched at once, and requests
+        that arrive while a batch runs form the next one.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._search_queue = queue
+        
+        try:
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < SEARCH_BATCH_MAX and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                queries = [query for query, _, _ in batch]
+                top_ks = [top_k for _, top_k, _ in batch]
+                try:
+                    batch_results = await loop.run_in_executor(
+                        None, self.search_batch, queries, top_ks
+                    )
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                
+                for (_, _, future), hits in zip(batch, batch_results):
+                    if not future.done():
+                        future.set_result(hits)
+        finally:
+            self._search_queue = None
+            # Don't leave callers waiting on a batcher that has stopped
+            while not queue.empty():
+                _, _, future = queue.get_nowait()
+                future.cancel()
+    
+    def warmup(self):
+        """
+        Run the fit, transform and scoring code paths once on a throwaway
+        index, so the first real ingest/search doesn't pay for first-call
+        setup inside scikit-learn and SciPy.
+        """
+        vectorizer = _make_vectorizer()
+        matrix = vectorizer.fit_transform(["warmup document text", "another warmup document"])
+        matrix @ vectorizer.transform(["warmup text"]).T.toarray()
+    
     def get_stats(self) -> Dict:
         """Get retriever statistics."""
         return {
-            "total_chunks": len(self.chunks),
-            "index_size": len(self.chunks),
+            "total_chunks": len(self.texts),
+            "index_size": len(self.texts),
             "dimension": self.vectorizer.max_features if self.vectorizer else 0,
             "model": "TF-IDF (scikit-learn)"
         }
     
     def clear(self):
         """Clear all stored chunks and reset index."""
-        self.tfidf_matrix = None
-        self.chunks = []
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        with self._write_lock, self._lock:
+            self.tfidf_matrix = None
+            self.texts = []
+            self.filenames = []
+            self.chunk_indices = np.empty(0, dtype=np.int32)
+            self.token_estimates = np.empty(0, dtype=np.int32)
+            self._fitted_rows = 0
+            self._chunk_keys = set()
+            self._query_cache.clear()
+            self.vectorizer = _make_vectorizer()
+            self.corpus_version += 1
         print("Retriever cleared")
 
 
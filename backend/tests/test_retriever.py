@@ -0,0 +1,47 @@
+"""
+Tests for the TF-IDF retriever.
+Run from backend/: python -m unittest discover tests
+"""
+import unittest
+
+from retriever import TFIDFRetriever
+
+
+def _chunks(texts, filename):
+    return [
+        {"text": text, "filename": filename, "chunk_index": i}
+        for i, text in enumerate(texts)
+    ]
+
+
+class AddChunksTest(unittest.TestCase):
+    def test_second_smaller_document_is_searchable(self):
+        # The second document adds far less than TFIDF_REFIT_GROWTH, but is
+        # about a new topic, so its terms must still enter the vocabulary
+        retriever = TFIDFRetriever()
+        retriever.add_chunks(_chunks(
+            [f"Cells divide by mitosis, sample {i}, replicating DNA and chromosomes." for i in range(10)],
+            "bio.txt"
+        ))
+        retriever.add_chunks(_chunks(["Acme invoice revenue for the quarter."], "acme.txt"))
+        
+        hits = retriever.search("Acme invoice revenue")
+        
+        self.assertEqual(hits[0].filename, "acme.txt")
+        self.assertGreater(hits[0].score, 0.0)
+    
+    def test_same_text_is_indexed_per_file(self):
+        retriever = TFIDFRetriever()
+        texts = ["Quarterly revenue grew in every region.", "Costs were flat."]
+        
+        self.assertEqual(retriever.add_chunks(_chunks(texts, "report.txt")), 2)
+        # Re-uploading the same file adds nothing; a renamed copy is indexed
+        self.assertEqual(retriever.add_chunks(_chunks(texts, "report.txt")), 0)
+        self.assertEqual(retriever.add_chunks(_chunks(texts, "copy.txt")), 2)
+        
+        filenames = {hit.filename for hit in retriever.search("quarterly revenue", top_k=4)}
+        self.assertEqual(filenames, {"report.txt", "copy.txt"})
+
+
+if __name__ == "__main__":
+    unittest.main()
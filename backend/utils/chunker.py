@@ -3,56 +3,106 @@ Text chunking utilities for document processing.
 Implements overlapping chunking strategy for better context preservation.
 """
 import re
-from typing import List, Dict
-from config import CHUNK_SIZE, CHUNK_OVERLAP
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import tiktoken
+
+from config import CHUNK_SIZE, CHUNK_OVERLAP, TOKENIZER_ENCODING, TOKENIZER_RETRY_SECONDS
+
+_WS_RE = re.compile(r'\s+')
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+
+_encoding: Optional[tiktoken.Encoding] = None
+_encoding_retry_at = 0.0  # time.monotonic() of the next load attempt
+
+
+def load_encoding() -> Optional[tiktoken.Encoding]:
+    """
+    Load the BPE encoding once. The first load may download its ranks
+    (with no timeout), so this blocks: call it from a worker thread, never
+    the event loop. If loading fails, return None and retry only after
+    TOKENIZER_RETRY_SECONDS, so an unreachable download isn't retried on
+    every call.
+    """
+    global _encoding, _encoding_retry_at
+    if _encoding is None and time.monotonic() >= _encoding_retry_at:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            _encoding_retry_at = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            print(f"Could not load {TOKENIZER_ENCODING} encoding, estimating tokens from word counts: {e}")
+    return _encoding
+
+
+def _get_encoding() -> Optional[tiktoken.Encoding]:
+    """Return the encoding if it has been loaded; never loads it."""
+    return _encoding
 
 
 def estimate_tokens(text: str) -> int:
     """
-    Estimate token count using simple word-based heuristic.
-    Approximation: ~1.3 tokens per word for English text.
+    Count tokens with tiktoken's BPE encoder.
+    Accurate for code, CJK and long words, unlike a words-based heuristic,
+    which is only used until load_encoding() succeeds. Never downloads
+    anything, so it is safe to call on the event loop.
     
     Args:
         text: Input text
         
     Returns:
-        Estimated token count
+        Token count
     """
-    words = len(text.split())
-    return int(words * 1.3)
+    encoding = _get_encoding()
+    if encoding is None:
+        # ~1.3 tokens per word for English text
+        return int(len(text.split()) * 1.3)
+    
+    # disallowed_special=() treats "<|endoftext|>" etc. in documents as plain text
+    return len(encoding.encode(text, disallowed_special=()))
 
 
-def chunk_text(
-    text: str,
+def _make_chunk(text: str, filename: str, chunk_index: int, token_estimate: int) -> Dict:
+    """
+    Build a chunk dictionary with metadata.
+    
+    token_estimate is the running sum of the chunk's sentence/word counts,
+    so the joined text is never re-tokenized.
+    """
+    return {
+        "text": text,
+        "filename": filename,
+        "chunk_index": chunk_index,
+        "token_estimate": token_estimate
+    }
+
+
+def _split_sentences(text: str) -> List[str]:
+    """Collapse whitespace and split text on sentence boundaries."""
+    return _SENT_RE.split(_WS_RE.sub(' ', text).strip())
+
+
+def _chunk_sentences(
+    sentences: Iterable[str],
     filename: str,
-    chunk_size: int = CHUNK_SIZE,
-    chunk_overlap: int = CHUNK_OVERLAP
+    chunk_size: int,
+    chunk_overlap: int
 ) -> List[Dict]:
     """
-    Split text into overlapping chunks with metadata.
+    Pack sentences into overlapping chunks.
     
-    Args:
-        text: Full document text
-        filename: Source filename for metadata
-        chunk_size: Target chunk size in tokens
-        chunk_overlap: Overlap between chunks in tokens
-        
-    Returns:
-        List of chunk dictionaries with text and metadata
+    Each sentence is tokenized once; the current chunk is a sliding window
+    over the sentence list tracked by a start index and a running token
+    sum, so text is only joined when a chunk is emitted and its
+    token_estimate comes from that sum.
     """
-    if not text or not text.strip():
-        return []
-    
-    # Clean text
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Split into sentences for better boundaries
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
     chunks = []
-    current_chunk = []
+    # Current chunk is segments[lo:] holding current_tokens tokens; segments
+    # are sentences, or words left over from splitting a long sentence
+    segments: List[str] = []
+    segment_tokens: List[int] = []
+    lo = 0
     current_tokens = 0
-    chunk_index = 0
     
     for sentence in sentences:
         sentence_tokens = estimate_tokens(sentence)
@@ -60,84 +110,115 @@ def chunk_text(
         # If single sentence exceeds chunk size, split by words
         if sentence_tokens > chunk_size:
             # Flush current chunk first
-            if current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                chunks.append({
-                    "text": chunk_text,
-                    "filename": filename,
-                    "chunk_index": chunk_index,
-                    "token_estimate": estimate_tokens(chunk_text)
-                })
-                chunk_index += 1
-                current_chunk = []
-                current_tokens = 0
+            if lo < len(segments):
+                chunks.append(_make_chunk(' '.join(segments[lo:]), filename, len(chunks), current_tokens))
             
-            # Split long sentence by words
+            # Split long sentence by words, sliding a window words[w_lo:w_hi]
             words = sentence.split()
-            word_chunk = []
-            word_tokens = 0
+            word_tokens = [estimate_tokens(word) for word in words]
+            w_lo = 0
+            window_tokens = 0
             
-            for word in words:
-                word_token_count = estimate_tokens(word)
-                if word_tokens + word_token_count > chunk_size and word_chunk:
-                    chunk_text = ' '.join(word_chunk)
-                    chunks.append({
-                        "text": chunk_text,
-                        "filename": filename,
-                        "chunk_index": chunk_index,
-                        "token_estimate": estimate_tokens(chunk_text)
-                    })
-                    chunk_index += 1
+            for w_hi, word_token_count in enumerate(word_tokens):
+                if window_tokens + word_token_count > chunk_size and w_hi > w_lo:
+                    chunks.append(_make_chunk(' '.join(words[w_lo:w_hi]), filename, len(chunks), window_tokens))
                     
                     # Keep overlap
-                    overlap_words = max(1, int(len(word_chunk) * (chunk_overlap / chunk_size)))
-                    word_chunk = word_chunk[-overlap_words:]
-                    word_tokens = estimate_tokens(' '.join(word_chunk))
+                    overlap_words = max(1, int((w_hi - w_lo) * (chunk_overlap / chunk_size)))
+                    w_lo = w_hi - overlap_words
+                    window_tokens = sum(word_tokens[w_lo:w_hi])
                 
-                word_chunk.append(word)
-                word_tokens += word_token_count
+                window_tokens += word_token_count
             
-            if word_chunk:
-                current_chunk = word_chunk
-                current_tokens = word_tokens
+            # The tail of the sentence starts the next chunk
+            segments = words[w_lo:]
+            segment_tokens = word_tokens[w_lo:]
+            lo = 0
+            current_tokens = window_tokens
             continue
         
         # Check if adding sentence exceeds chunk size
-        if current_tokens + sentence_tokens > chunk_size and current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            chunks.append({
-                "text": chunk_text,
-                "filename": filename,
-                "chunk_index": chunk_index,
-                "token_estimate": estimate_tokens(chunk_text)
-            })
-            chunk_index += 1
+        if current_tokens + sentence_tokens > chunk_size and lo < len(segments):
+            chunks.append(_make_chunk(' '.join(segments[lo:]), filename, len(chunks), current_tokens))
             
-            # Keep overlap sentences
+            # Keep overlap sentences: move lo back from the end while they fit
             overlap_tokens = 0
-            overlap_sentences = []
-            for sent in reversed(current_chunk):
-                sent_tokens = estimate_tokens(sent)
-                if overlap_tokens + sent_tokens <= chunk_overlap:
-                    overlap_sentences.insert(0, sent)
-                    overlap_tokens += sent_tokens
-                else:
-                    break
+            overlap_lo = len(segments)
+            while overlap_lo > lo and overlap_tokens + segment_tokens[overlap_lo - 1] <= chunk_overlap:
+                overlap_lo -= 1
+                overlap_tokens += segment_tokens[overlap_lo]
             
-            current_chunk = overlap_sentences
+            lo = overlap_lo
             current_tokens = overlap_tokens
         
-        current_chunk.append(sentence)
+        segments.append(sentence)
+        segment_tokens.append(sentence_tokens)
         current_tokens += sentence_tokens
     
     # Don't forget the last chunk
-    if current_chunk:
-        chunk_text = ' '.join(current_chunk)
-        chunks.append({
-            "text": chunk_text,
-            "filename": filename,
-            "chunk_index": chunk_index,
-            "token_estimate": estimate_tokens(chunk_text)
-        })
+    if lo < len(segments):
+        chunks.append(_make_chunk(' '.join(segments[lo:]), filename, len(chunks), current_tokens))
     
     return chunks
+
+
+def chunk_text(
+    text: str,
+    filename: str,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP
+) -> List[Dict]:
+    """
+    Split text into overlapping chunks with metadata.
+    
+    Args:
+        text: Full document text
+        filename: Source filename for metadata
+        chunk_size: Target chunk size in tokens
+        chunk_overlap: Overlap between chunks in tokens
+        
+    Returns:
+        List of chunk dictionaries with text and metadata
+    """
+    if not text or text.isspace():
+        return []
+    
+    # Chunking runs on ingestion threads, where a (re)load may block
+    load_encoding()
+    
+    # Split into sentences for better boundaries
+    return _chunk_sentences(_split_sentences(text), filename, chunk_size, chunk_overlap)
+
+
+def chunk_pages(
+    pages: Iterable[Tuple[int, str]],
+    filename: str,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP
+) -> List[Dict]:
+    """
+    Split per-page texts into overlapping chunks with metadata.
+    
+    Takes the (page_number, text) records a loader already produced, so
+    the joined document text is never cleaned and re-split. Chunks still
+    span page boundaries, but a sentence never does.
+    
+    Args:
+        pages: (page_number, text) records in reading order
+        filename: Source filename for metadata
+        chunk_size: Target chunk size in tokens
+        chunk_overlap: Overlap between chunks in tokens
+        
+    Returns:
+        List of chunk dictionaries with text and metadata
+    """
+    # Chunking runs on ingestion threads, where a (re)load may block
+    load_encoding()
+    
+    sentences = (
+        sentence
+        for _, page_text in pages
+        if page_text and not page_text.isspace()
+        for sentence in _split_sentences(page_text)
+    )
+    return _chunk_sentences(sentences, filename, chunk_size, chunk_overlap)
@@ -1,100 +1,693 @@
 """
 Text file loaders for PDF and TXT documents.
 Lightweight implementations suitable for free tier deployment.
+PyMuPDF is the only PDF backend and is a required dependency.
 """
+import asyncio
+import codecs
+import hashlib
 import io
-from typing import Tuple
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import singledispatch
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+import pymupdf
 
-def load_txt(content: bytes, filename: str) -> Tuple[str, dict]:
+from config import (
+    DOC_CACHE_SIZE,
+    PAGE_CACHE_MAX_DOC_PAGES,
+    PAGE_CACHE_SIZE,
+    PDF_MAX_WORKERS,
+    PDF_PAGES_PER_TASK,
+    PDF_PROCESS_MIN_PAGES,
+    PDF_SKIP_FONTLESS_PAGES
+)
+
+# Loaders accept raw bytes, a buffer view (e.g. of a memory-mapped file) or a
+# binary file object (e.g. a spooled upload)
+Source = Union[bytes, memoryview, BinaryIO]
+Content = Union[bytes, memoryview]
+
+# LRU of (content digest, with page records) -> (text, metadata); ingestion
+# runs on worker threads, so access is locked
+_DOC_CACHE: OrderedDict = OrderedDict()
+_DOC_CACHE_LOCK = threading.Lock()
+
+# LRU of (content digest, page number) -> page text, so re-reading pages of
+# a PDF (e.g. a different page selection) skips get_text()
+_PAGE_CACHE: OrderedDict = OrderedDict()
+_PAGE_CACHE_LOCK = threading.Lock()
+
+# PyMuPDF initializes MuPDF single-threaded (no internal locking), so calls
+# into it from concurrent ingestion threads are serialized in-process
+_MUPDF_LOCK = threading.Lock()
+
+# Recoverable errors in damaged PDFs would otherwise be written to stderr as
+# they occur, often once per page. Set at import, so worker processes (which
+# import this module) are configured too
+pymupdf.TOOLS.mupdf_display_errors(False)
+
+
+# PDF bytes in a page-extraction worker process, set once by the pool
+# initializer so they aren't pickled again for every task
+_worker_content: Optional[bytes] = None
+
+
+def _read_content(source: Source) -> Content:
+    """Return the source's bytes, reading file objects once; buffers aren't copied."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, io.BytesIO):
+        # View the remaining buffer in place; read() would copy it out, and
+        # pymupdf.open() takes the view without copying it again
+        return source.getbuffer()[source.tell():]
+    return source.read()
+
+
+def _release_view(content: Content, source: Source):
+    """
+    Release a view _read_content made over a caller's BytesIO. Until then
+    the BytesIO can't be closed or resized, and a traceback that keeps the
+    frame alive would keep the view too, so loaders do this in finally.
+    """
+    if isinstance(content, memoryview) and content is not source:
+        content.release()
+
+
+def _content_digest(content: Content) -> bytes:
+    """Fingerprint file content for the document and page caches."""
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def load_txt(source: Source, filename: str) -> Tuple[str, dict]:
     """
     Load text from a TXT file.
     
     Args:
-        content: Raw file bytes
+        source: Raw file bytes, a buffer view or a binary file object
         filename: Original filename
         
     Returns:
         Tuple of (extracted_text, metadata)
     """
+    content = _read_content(source)
     try:
-        text = content.decode('utf-8')
-    except UnicodeDecodeError:
-        # Try common fallback encodings
+        size = len(content)
+        
+        # str() decodes any buffer (bytes, memoryview, mmap) without a bytes copy
         try:
-            text = content.decode('latin-1')
-        except:
-            text = content.decode('utf-8', errors='ignore')
+            # utf-8-sig drops a leading BOM in the same pass
+            text = str(content, 'utf-8-sig')
+        except UnicodeDecodeError:
+            # latin-1 maps every byte, so this can't fail
+            text = str(content, 'latin-1')
+    finally:
+        _release_view(content, source)
+    
+    # Drop our reference to the raw bytes before strip() copies the text
+    content = None
     
     metadata = {
         "filename": filename,
         "type": "txt",
-        "size": len(content)
+        "size": size
     }
     
     return text.strip(), metadata
 
 
-def load_pdf(content: bytes, filename: str) -> Tuple[str, dict]:
+def load_txt_from_path(path: str) -> Tuple[str, dict]:
     """
-    Load text from a PDF file using pypdf.
+    Load a TXT file from disk by decoding a memory map of it, so the
+    file is never read into a bytes object first. Unlike load_document,
+    this skips the content cache.
     
     Args:
-        content: Raw file bytes
-        filename: Original filename
+        path: Path to the file
         
     Returns:
         Tuple of (extracted_text, metadata)
     """
+    with open(path, 'rb') as f, _map_file(f) as content:
+        return load_txt(content, os.path.basename(path))
+
+
+def _page_text(doc, page_number: int, flags: int) -> str:
+    """Extract one page's plain text while holding the MuPDF lock."""
+    with _MUPDF_LOCK:
+        # Page content draws text with fonts from the page's resources
+        # (including inherited ones and form XObjects), but annotations and
+        # form fields carry their own appearance resources. A page with no
+        # fonts and no /Annots entry is blank, so its content stream needn't
+        # be interpreted
+        if (PDF_SKIP_FONTLESS_PAGES and
+                not doc.get_page_fonts(page_number) and
+                doc.xref_get_key(doc.page_xref(page_number), "Annots")[0] == "null"):
+            return ""
+        return doc[page_number].get_text("text", sort=False, flags=flags)
+
+
+def _iter_pages(
+    doc,
+    page_numbers: Iterable[int],
+    content_hash: Optional[bytes] = None,
+    force_refresh: bool = False
+) -> Iterator[str]:
+    """
+    Yield the text of the given pages of an open PyMuPDF document.
+    
+    With a content_hash, pages are served from and stored in the page
+    cache (force_refresh re-extracts and overwrites them).
+    """
+    # Plain reading order (no layout sort); clip to the page so off-page
+    # text isn't extracted
+    flags = pymupdf.TEXT_PRESERVE_WHITESPACE | pymupdf.TEXT_MEDIABOX_CLIP
+    for i in page_numbers:
+        if content_hash is None:
+            yield _page_text(doc, i, flags)
+            continue
+        
+        key = (content_hash, i)
+        text = None
+        if not force_refresh:
+            with _PAGE_CACHE_LOCK:
+                text = _PAGE_CACHE.get(key)
+                if text is not None:
+                    _PAGE_CACHE.move_to_end(key)
+        
+        if text is None:
+            text = _page_text(doc, i, flags)
+            with _PAGE_CACHE_LOCK:
+                _PAGE_CACHE[key] = text
+                _PAGE_CACHE.move_to_end(key)
+                if len(_PAGE_CACHE) > PAGE_CACHE_SIZE:
+                    _PAGE_CACHE.popitem(last=False)
+        
+        yield text
+
+
+def _init_pdf_worker(content: bytes):
+    """Pool initializer: keep the PDF bytes for this worker's tasks."""
+    global _worker_content
+    _worker_content = content
+
+
+def _extract_range_in_worker(page_range: Tuple[int, int]) -> List[str]:
+    """Open the worker's own Document and extract one page range."""
+    start, stop = page_range
+    doc = pymupdf.open(stream=_worker_content, filetype="pdf")
     try:
-        from pypdf import PdfReader
-    except ImportError:
-        raise ImportError("pypdf is required for PDF processing. Install with: pip install pypdf")
+        # The range length is known, so fill a presized list by position
+        texts = [""] * (stop - start)
+        for slot, text in enumerate(_iter_pages(doc, range(start, stop))):
+            texts[slot] = text
+        return texts
+    finally:
+        doc.close()
+
+
+def _usable_cpus() -> int:
+    """Number of CPUs this process may run on, not the host's core count."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS or Windows
+        return os.cpu_count() or 1
+
+
+def _extract_pages_parallel(
+    content: Content,
+    num_pages: int,
+    max_workers: int,
+    pages_per_task: int = PDF_PAGES_PER_TASK
+) -> Iterator[str]:
+    """
+    Extract all page texts with a pool of worker processes.
+    
+    Pages are split into contiguous ranges so each task pays for opening
+    the document (xref, page tree, fonts) once per range, not per page.
+    Each worker opens its own Document; MuPDF is initialized
+    single-threaded by PyMuPDF, so the workers must be processes, never
+    threads sharing one interpreter.
+    
+    Args:
+        content: PDF bytes
+        num_pages: Page count of the document
+        max_workers: Number of worker processes
+        pages_per_task: Pages handled by each task
+        
+    Yields:
+        Page texts in page order
+    """
+    if not isinstance(content, bytes):
+        content = bytes(content)  # buffer views can't be pickled to the workers
+    
+    page_ranges = [
+        (start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
     
-    text_parts = []
+    # spawn, not fork: the server process runs threads (and MuPDF state)
+    # that must not be duplicated into the children
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(page_ranges)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_pdf_worker,
+        initargs=(content,)
+    ) as pool:
+        for range_texts in pool.map(_extract_range_in_worker, page_ranges):
+            yield from range_texts
+
+
+def _open_pdf(content: Content) -> Tuple[object, int]:
+    """Open a PyMuPDF Document over an in-memory PDF buffer; returns (doc, page_count)."""
+    with _MUPDF_LOCK:
+        doc = pymupdf.open(stream=content, filetype="pdf")
+        return doc, doc.page_count
+
+
+def _close_pdf(doc):
+    """Close a Document opened by _open_pdf and release MuPDF's caches."""
+    with _MUPDF_LOCK:
+        doc.close()
+        # The server process is long-lived: empty MuPDF's resource store
+        # (fonts, images) between documents, and the warnings list PyMuPDF
+        # otherwise keeps growing for the life of the process
+        pymupdf.TOOLS.store_shrink(100)
+        pymupdf.TOOLS.reset_mupdf_warnings()
+
+
+def _iter_doc_pages(
+    doc,
+    num_pages: int,
+    content: Content,
+    filename: str,
+    pages: Optional[Sequence[int]],
+    content_hash: bytes,
+    force_refresh: bool
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for the non-blank selected pages of an
+    open document, in order. Shared by load_pdf and iload_pdf.
+    
+    MuPDF errors on a page are raised as ValueError: the file is damaged,
+    which is the caller's problem rather than the server's.
+    """
+    # Leave a core for the server; a single worker would only add overhead
+    max_workers = min(PDF_MAX_WORKERS, _usable_cpus() - 1)
+    
+    if pages is not None:
+        invalid = [page for page in pages if not 0 <= page < num_pages]
+        if invalid:
+            raise ValueError(f"Pages {invalid} not in {filename} ({num_pages} pages)")
+        page_numbers = pages
+    else:
+        page_numbers = range(num_pages)
+    
+    # Large extractions bypass the page cache rather than flood it
+    if len(page_numbers) > PAGE_CACHE_MAX_DOC_PAGES:
+        content_hash = None
+    
+    if pages is None and num_pages > PDF_PROCESS_MIN_PAGES and max_workers >= 2:
+        # Workers open their own Documents from the same bytes
+        page_texts = _extract_pages_parallel(content, num_pages, max_workers)
+    else:
+        page_texts = _iter_pages(doc, page_numbers, content_hash, force_refresh)
+    
+    try:
+        for page_number, text in zip(page_numbers, page_texts):
+            # isspace() stops at the first non-whitespace character
+            if text and not text.isspace():
+                yield page_number, text
+    except BrokenExecutor:
+        # A dead worker pool is a server fault, not a damaged file
+        raise
+    except (RuntimeError, pymupdf.mupdf.FzErrorBase) as e:
+        raise ValueError(f"Could not read {filename}: {e}") from e
+
+
+def iload_pdf(
+    source: Source,
+    filename: str,
+    pages: Optional[Sequence[int]] = None,
+    content_hash: Optional[bytes] = None,
+    force_refresh: bool = False
+) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily extract text from a PDF file, one page at a time.
+    
+    Pages are extracted only as the caller consumes them, so downstream
+    work can overlap with parsing and only one page needs to be held.
+    
+    Args:
+        source: Raw file bytes, a buffer view or a binary file object
+        filename: Original filename
+        pages: 0-based page numbers to extract, in order; None extracts
+            every page
+        content_hash: Digest of the content, if the caller already has one
+        force_refresh: Extract pages again even if they are cached
+        
+    Yields:
+        Tuples of (page_number, text) for pages that contain text
+        
+    Raises:
+        ValueError: If a requested page is not in the document, or MuPDF
+            fails on a page
+    """
+    content = _read_content(source)
+    try:
+        if content_hash is None:
+            content_hash = _content_digest(content)
+        doc, num_pages = _open_pdf(content)
+        
+        try:
+            yield from _iter_doc_pages(doc, num_pages, content, filename, pages, content_hash, force_refresh)
+        finally:
+            _close_pdf(doc)
+    finally:
+        _release_view(content, source)
+
+
+def load_pdf(
+    source: Source,
+    filename: str,
+    pages: Optional[Sequence[int]] = None,
+    content_hash: Optional[bytes] = None,
+    force_refresh: bool = False,
+    return_pages: bool = False
+) -> Tuple[str, dict]:
+    """
+    Load text from a PDF file using PyMuPDF.
     
-    # Open PDF from bytes
-    pdf_stream = io.BytesIO(content)
-    reader = PdfReader(pdf_stream)
+    MuPDF parses the document in C, which is much faster than a
+    pure-Python parser on text-heavy PDFs. Very large documents can be
+    split across worker processes (see PDF_MAX_WORKERS).
     
-    num_pages = len(reader.pages)
+    Args:
+        source: Raw file bytes, a buffer view or a binary file object
+        filename: Original filename
+        pages: 0-based page numbers to extract, in order; None extracts
+            every page and an empty sequence only reads the metadata
+        content_hash: Digest of the content, if the caller already has one
+        force_refresh: Extract pages again even if they are cached
+        return_pages: Return the non-blank pages as (page_number, text)
+            records under metadata["page_texts"] instead of joining them,
+            so callers can work per page; the returned text is then ""
+        
+    Returns:
+        Tuple of (extracted_text, metadata)
+        
+    Raises:
+        ValueError: If a requested page is not in the document, or MuPDF
+            fails on a page
+    """
+    # MuPDF opens documents from an in-memory buffer
+    content = _read_content(source)
+    try:
+        size = len(content)
+        if content_hash is None:
+            content_hash = _content_digest(content)
+        doc, num_pages = _open_pdf(content)
+        
+        try:
+            page_records = _iter_doc_pages(doc, num_pages, content, filename, pages, content_hash, force_refresh)
+            if return_pages:
+                # The pages are the result; a joined copy would double it
+                page_texts = list(page_records)
+            else:
+                # Write pages into one buffer as they are extracted, so page strings
+                # are freed right away instead of all being held for a final join
+                page_texts = None
+                buf = io.StringIO()
+                for _, text in page_records:
+                    buf.write(text)
+                    buf.write("\n\n")
+        finally:
+            _close_pdf(doc)
+    finally:
+        _release_view(content, source)
     
-    for page in reader.pages:
-        text = page.extract_text()
-        if text and text.strip():
-            text_parts.append(text)
+    # A closed Document still references its stream; drop both so the raw
+    # bytes can be freed before the final text copies are made
+    doc = content = None
     
-    full_text = "\n\n".join(text_parts)
+    if page_texts is None:
+        full_text = buf.getvalue().strip()
+        buf.close()
+    else:
+        full_text = ""
     
     metadata = {
         "filename": filename,
         "type": "pdf",
-        "size": len(content),
+        "size": size,
         "pages": num_pages
     }
+    if page_texts is not None:
+        metadata["page_texts"] = page_texts
+    
+    return full_text, metadata
+
+
+# Loader per sniffed file type
+_LOADERS = {
+    "txt": load_txt,
+    "pdf": load_pdf,
+}
+
+# Bytes that occur in text files: printable ASCII, high bytes (UTF-8 and
+# latin-1 sequences) and the usual whitespace/control characters
+_TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+
+def _is_probably_text(sample: Content) -> bool:
+    """
+    Guess whether a sample of a file is text, in the manner of file(1):
+    no NUL bytes, and at most 30% bytes that don't occur in text.
+    """
+    sample = bytes(sample)
+    if b"\x00" in sample:
+        return False
+    return len(sample.translate(None, _TEXT_BYTES)) <= len(sample) * 0.3
+
+
+def _sniff_type(content: Content) -> Optional[str]:
+    """Detect the file type from its leading bytes ("pdf", "txt" or None)."""
+    # The header must open the file (after at most a BOM and whitespace),
+    # so text that merely mentions "%PDF-" isn't routed to MuPDF
+    head = bytes(content[:1024])
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    if head.lstrip().startswith(b"%PDF-"):
+        return "pdf"
+    if _is_probably_text(content[:4096]):
+        return "txt"
+    return None
+
+
+def _load_content(content: Content, filename: str, force_refresh: bool, return_pages: bool) -> Tuple[str, dict]:
+    """Sniff, load and cache content already read by load_document."""
+    file_type = _sniff_type(content)
+    if file_type is None:
+        raise ValueError(f"Unsupported file type: {filename}. Only PDF and plain text files are supported.")
+    
+    loader = _LOADERS[file_type]
+    digest = _content_digest(content)
+    # Page records are only produced for PDFs, and only cached when asked for
+    return_pages = return_pages and loader is load_pdf
+    key = (digest, return_pages)
     
-    return full_text.strip(), metadata
+    if not force_refresh:
+        with _DOC_CACHE_LOCK:
+            cached = _DOC_CACHE.get(key)
+            if cached is not None:
+                _DOC_CACHE.move_to_end(key)
+        if cached is not None:
+            text, metadata = cached
+            # The filename isn't part of the key; report the current one
+            return text, {**metadata, "filename": filename}
+    
+    if loader is load_pdf:
+        # Share the digest with load_pdf's page cache
+        try:
+            text, metadata = loader(
+                content,
+                filename,
+                content_hash=digest,
+                force_refresh=force_refresh,
+                return_pages=return_pages
+            )
+        except pymupdf.FileDataError as e:
+            # Text that starts like a PDF (e.g. notes on the format) is
+            # still text; anything else really is a damaged PDF
+            if not _is_probably_text(content[:4096]):
+                raise ValueError(f"Could not read {filename}: {e}") from e
+            text, metadata = load_txt(content, filename)
+    else:
+        text, metadata = loader(content, filename)
+    
+    with _DOC_CACHE_LOCK:
+        _DOC_CACHE[key] = (text, dict(metadata))
+        _DOC_CACHE.move_to_end(key)
+        if len(_DOC_CACHE) > DOC_CACHE_SIZE:
+            _DOC_CACHE.popitem(last=False)
+    
+    return text, metadata
 
 
-def load_document(content: bytes, filename: str) -> Tuple[str, dict]:
+@singledispatch
+def load_document(
+    source: Source,
+    filename: str,
+    force_refresh: bool = False,
+    return_pages: bool = False
+) -> Tuple[str, dict]:
     """
-    Load a document based on its file extension.
+    Load a document, detecting its type from the content.
+    
+    The type comes from the leading bytes rather than the filename, so
+    renamed uploads or ones without an extension still load, and
+    mislabeled files never reach the wrong parser. Results are cached by
+    a hash of the file content, so re-uploading the same bytes (under any
+    filename) skips parsing. A Path source is memory-mapped instead of
+    read (see _load_document_from_path).
     
     Args:
-        content: Raw file bytes
+        source: Raw file bytes, a buffer view or a binary file object
         filename: Original filename
+        force_refresh: Parse again even if the content is cached
+        return_pages: For PDFs, return per-page records under
+            metadata["page_texts"] instead of the joined text (see load_pdf)
         
     Returns:
         Tuple of (extracted_text, metadata)
         
     Raises:
-        ValueError: If file type is not supported
+        ValueError: If the content is neither a PDF nor text, or is a
+            damaged PDF
     """
-    filename_lower = filename.lower()
+    content = _read_content(source)
+    try:
+        return _load_content(content, filename, force_refresh, return_pages)
+    finally:
+        _release_view(content, source)
+
+
+@contextmanager
+def _map_file(f: BinaryIO) -> Iterator[Content]:
+    """
+    Memory-map an open file read-only and yield a view of it from the
+    current position, so it can be hashed and parsed without a bytes copy.
+    Empty files can't be mapped and yield b"".
+    """
+    offset = f.tell()
+    if os.fstat(f.fileno()).st_size <= offset:
+        yield b""
+        return
     
-    if filename_lower.endswith('.txt'):
-        return load_txt(content, filename)
-    elif filename_lower.endswith('.pdf'):
-        return load_pdf(content, filename)
-    else:
-        raise ValueError(f"Unsupported file type: {filename}. Only .txt and .pdf are supported.")
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped)[offset:] as view:
+            yield view
+
+
+@load_document.register
+def _load_document_from_path(
+    source: Path,
+    filename: Optional[str] = None,
+    force_refresh: bool = False,
+    return_pages: bool = False
+) -> Tuple[str, dict]:
+    """
+    Load a document from disk through a read-only memory map, so the file
+    is hashed and parsed in place rather than read into a bytes copy.
+    
+    Args:
+        source: Path to the file
+        filename: Name to report in metadata (defaults to the file name)
+        force_refresh: Parse again even if the content is cached
+        return_pages: For PDFs, return per-page records instead of the text
+        
+    Returns:
+        Tuple of (extracted_text, metadata)
+    """
+    filename = filename or source.name
+    
+    with open(source, 'rb') as f, _map_file(f) as content:
+        return load_document(content, filename, force_refresh, return_pages)
+
+
+@load_document.register
+def _load_document_from_spool(
+    source: tempfile.SpooledTemporaryFile,
+    filename: str,
+    force_refresh: bool = False,
+    return_pages: bool = False
+) -> Tuple[str, dict]:
+    """
+    Load a document from a spooled upload (Starlette's UploadFile.file)
+    without copying it: a spool still in memory is viewed through its
+    BytesIO, and one rolled over to disk is memory-mapped. read() would
+    copy the whole upload into one bytes object.
+    
+    Args:
+        source: Spooled file positioned at the start of the content
+        filename: Original filename
+        force_refresh: Parse again even if the content is cached
+        return_pages: For PDFs, return per-page records instead of the text
+        
+    Returns:
+        Tuple of (extracted_text, metadata)
+    """
+    # The spool exposes no public way to reach its buffer; fileno() would
+    # force an in-memory spool to roll over to disk
+    if not source._rolled:
+        return load_document(source._file, filename, force_refresh, return_pages)
+    
+    with _map_file(source._file) as content:
+        return load_document(content, filename, force_refresh, return_pages)
+
+
+async def load_documents(
+    files: Sequence[Tuple[Source, str]],
+    max_concurrency: Optional[int] = None
+) -> List[Tuple[str, dict]]:
+    """
+    Load several documents concurrently from async code.
+    
+    Each file is loaded with load_document on a thread pool of at most
+    max_concurrency threads, created for this batch. Hashing and cache
+    hits overlap fully; MuPDF calls are still serialized by its lock.
+    
+    Args:
+        files: (source, filename) pairs
+        max_concurrency: Maximum number of files loaded at the same time
+            (default: the CPUs this process may use)
+        
+    Returns:
+        One (extracted_text, metadata) tuple per file, in input order
+        
+    Raises:
+        ValueError: If a file type is not supported
+    """
+    if not files:
+        return []
+    
+    max_workers = min(max_concurrency or _usable_cpus(), len(files))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load_documents")
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.gather(*(
+            loop.run_in_executor(executor, load_document, source, filename)
+            for source, filename in files
+        ))
+    finally:
+        # Don't block the event loop joining the threads
+        executor.shutdown(wait=False)